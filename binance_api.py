@@ -2,8 +2,29 @@ import hmac
 import hashlib
 import time
 import httpx
+import orjson
+import numpy as np
 from decimal import Decimal, ROUND_DOWN
+from functools import lru_cache
 from typing import Optional, Dict, List
+from urllib.parse import urlencode
+
+
+@lru_cache(maxsize=256)
+def _split_step(step_size_str: str):
+    """
+    แปลง stepSize/tickSize เป็น (step_decimal, จำนวนทศนิยม, scale สำหรับ Fast Path)
+    Memoize ไว้เพราะ exchangeInfo มีหลายพันเหรียญแต่ค่า step ซ้ำกันไม่กี่แบบ
+    """
+    step_dec = Decimal(step_size_str).normalize()
+    step_tuple = step_dec.as_tuple()
+    places = max(0, -step_tuple.exponent)
+    if step_tuple.digits == (1,) and step_tuple.exponent <= 0:
+        scale = 10 ** places
+    else:
+        scale = None
+    return step_dec, places, scale
+
 
 class BinanceAsyncClient:
     def __init__(self, api_key: str, api_secret: str, testnet: bool = False):
@@ -12,40 +33,70 @@ class BinanceAsyncClient:
         """
         self.api_key = api_key
         self.api_secret = api_secret
+        self._secret_bytes = api_secret.encode('utf-8') # Encode ครั้งเดียว ใช้เซ็นทุก Request
         self.base_url = "https://testnet.binance.vision" if testnet else "https://api.binance.com"
         self.symbol_filters = {} # เก็บข้อมูลกฎของแต่ละเหรียญ (Lot Size, Min Notional)
+        self._fmt_cache = {} # {(symbol, filter_type): (step_decimal, จำนวนตำแหน่งทศนิยม)}
+
+        # TTL Cache สำหรับ Endpoint ที่ Dashboard Poll ถี่ๆ: (เวลาที่ดึง, ค่า)
+        # กัน /api/status ยิง Binance ซ้ำๆ จนเปลือง Rate Limit โดยไม่จำเป็น
+        self._status_cache = (0.0, None) # ping TTL 2s
+        self._wallet_cache = (0.0, None) # account TTL 5s
+
+        # ใช้ Client ตัวเดียวตลอดอายุของบอท เพื่อ Reuse Connection เดิม (Keep-Alive)
+        # ไม่ต้องเสียเวลา TCP + TLS Handshake ใหม่ทุกครั้งที่ยิง API (~100-300ms ต่อครั้ง)
+        # - http2=True: Binance รองรับ ทำให้หลาย Request วิ่งบน Connection เดียวพร้อมกันได้
+        # - retries=2: ลองใหม่อัตโนมัติเมื่อ Connect ล้มเหลวชั่วคราว โดยไม่ต้อง Handshake ใหม่เอง
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"X-MBX-APIKEY": self.api_key},
+            timeout=10.0,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=30,
+                    keepalive_expiry=60.0
+                )
+            )
+        )
+
+    async def close(self):
+        """ปิด Connection Pool (ต้องเรียกตอน Shutdown เพื่อคืน Socket ให้ระบบ)"""
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
 
-    async def _get_signature(self, query_string: str) -> str:
+    def _get_signature(self, query_bytes: bytes) -> str:
         """สร้าง HMAC SHA256 Signature สำหรับ Private Endpoints"""
-        return hmac.new(
-            self.api_secret.encode('utf-8'),
-            query_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        # hmac.digest เป็น One-shot Path ระดับ C เร็วกว่า hmac.new().hexdigest()
+        # และงานนี้เป็น Pure CPU ไม่มี I/O จึงไม่ต้องเป็น async
+        return hmac.digest(self._secret_bytes, query_bytes, 'sha256').hex()
 
     async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, signed: bool = False):
         """จัดการการส่ง Request ทั้งแบบ Public และ Private"""
         if params is None:
             params = {}
-            
-        headers = {"X-MBX-APIKEY": self.api_key}
-        
+
         if signed:
             params['timestamp'] = int(time.time() * 1000)
-            # สร้าง Query String เพื่อไปทำ Signature
-            query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-            params['signature'] = await self._get_signature(query_string)
-
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                method=method,
-                url=f"{self.base_url}{endpoint}",
-                params=params,
-                headers=headers,
-                timeout=10.0
+            # สร้าง Canonical Query String ด้วย urlencode (เร็วและ Escape ถูกต้อง
+            # กว่า join เอง) แล้ว Encode เป็น bytes รอบเดียวเพื่อส่งเข้า HMAC ตรงๆ
+            params['signature'] = self._get_signature(
+                urlencode(params, doseq=True).encode('utf-8')
             )
-            response.raise_for_status() # แจ้งเตือนถ้า API ตอบกลับเป็น Error
-            return response.json()
+
+        # ใช้ Client ถาวรจาก __init__ (Connection Reuse) แทนการเปิด-ปิดใหม่ทุก Request
+        response = await self._client.request(method, endpoint, params=params)
+        response.raise_for_status() # แจ้งเตือนถ้า API ตอบกลับเป็น Error
+        # orjson เร็วกว่า stdlib json 2-5 เท่า โดยเฉพาะ Payload ใหญ่ๆ
+        # อย่าง klines / account balances
+        return orjson.loads(response.content)
 
     # ==========================================
     # ฟังก์ชันจัดการทศนิยม (แก้ปัญหา Scientific Notation)
@@ -54,9 +105,16 @@ class BinanceAsyncClient:
         """ดึงข้อมูลกฎของกระดานเทรด (ต้องเรียกใช้ตอนบอทเริ่มทำงาน)"""
         data = await self._request("GET", "/api/v3/exchangeInfo")
         for symbol_data in data['symbols']:
-            self.symbol_filters[symbol_data['symbol']] = {
+            symbol = symbol_data['symbol']
+            self.symbol_filters[symbol] = {
                 filter['filterType']: filter for filter in symbol_data['filters']
             }
+            # Precompute step size + จำนวนทศนิยมไว้ล่วงหน้า จะได้ไม่ต้อง parse
+            # Decimal ใหม่ทุกครั้งที่ format_number ถูกเรียก (ทุกออเดอร์)
+            for filter_type, filters in self.symbol_filters[symbol].items():
+                step_size_str = filters.get('stepSize') or filters.get('tickSize')
+                if step_size_str:
+                    self._fmt_cache[(symbol, filter_type)] = _split_step(step_size_str)
 
     def format_number(self, symbol: str, value: float, filter_type: str) -> str:
         """
@@ -64,63 +122,99 @@ class BinanceAsyncClient:
         - filter_type='LOT_SIZE' สำหรับ Quantity (จำนวนเหรียญ)
         - filter_type='PRICE_FILTER' สำหรับ Price (ราคา)
         """
-        if symbol not in self.symbol_filters:
+        cached = self._fmt_cache.get((symbol, filter_type))
+        if cached is None:
             # ถ้าไม่มีข้อมูล ให้คืนค่าเป็น string ธรรมดาไปก่อน
             return f"{Decimal(str(value)):f}"
 
-        filters = self.symbol_filters[symbol].get(filter_type, {})
-        step_size_str = filters.get('stepSize') or filters.get('tickSize')
-        
-        if not step_size_str:
-            return f"{Decimal(str(value)):f}"
+        # ใช้ step + จำนวนทศนิยมที่ precompute ไว้ตอน load_exchange_info
+        step_dec, places, scale = cached
+
+        # Fast Path: step เป็นเลขยกกำลังสิบ ใช้ Integer Floor บน float ตรงๆ
+        # เร็วกว่าเส้นทาง Decimal มาก (int() ปัดลงเหมือน ROUND_DOWN อยู่แล้ว)
+        # ใส่ Guard คูณ (1 + 1e-12) ก่อน Floor: ถ้า value เป็นจำนวนเท่าของ step
+        # พอดี ผลคูณ float อาจหลุดลงไปใต้จำนวนเต็มนิดเดียว (0.29*100 = 28.999...)
+        # แล้วโดนปัดหายไปทั้ง step ซึ่งผิดจากเส้นทาง Decimal
+        if scale is not None:
+            return f"{int(value * scale * (1 + 1e-12)) / scale:.{places}f}"
 
-        # แปลงเป็น Decimal เพื่อการคำนวณที่แม่นยำ
-        val_dec = Decimal(str(value))
-        step_dec = Decimal(step_size_str).normalize()
-        
         # ปัดเศษลง (ROUND_DOWN) ตาม step size ป้องกันปัญหา Insufficient Balance
-        quantized_val = (val_dec // step_dec) * step_dec
-        
+        quantized_val = (Decimal(str(value)) // step_dec) * step_dec
+
         # คืนค่าเป็น String (เช่น '0.00045') จะไม่มี e-05 โผล่มาแน่นอน
-        return f"{quantized_val:f}"
+        return format(quantized_val, f'.{places}f')
+
+    def calc_effective_qty(self, symbol: str, amount: float) -> Decimal:
+        """
+        คืนจำนวนเหรียญจริงหลังปัดลงตาม LOT_SIZE
+        (ค่าเดียวกับที่ place_order จะส่งไป ใช้เช็ค Min Notional ก่อนยิง API)
+        """
+        # ใช้เส้นทางเดียวกับ format_number เป๊ะๆ (รวม Fast Path) เพื่อรับประกัน
+        # ว่าค่าที่เช็คกับค่าที่ส่งออเดอร์จริงไม่มีทางต่างกัน
+        return Decimal(self.format_number(symbol, amount, 'LOT_SIZE'))
+
+    def get_min_notional(self, symbol: str) -> float:
+        """อ่านมูลค่าขั้นต่ำต่อออเดอร์จากกฎของเหรียญ (Fallback 10 USDT ถ้าไม่มีข้อมูล)"""
+        filters = self.symbol_filters.get(symbol, {})
+        notional_filter = filters.get('MIN_NOTIONAL') or filters.get('NOTIONAL') or {}
+        try:
+            return float(notional_filter.get('minNotional', 10.0))
+        except (TypeError, ValueError):
+            return 10.0
 
     # ==========================================
     # Interface ที่ BotEngine ของคุณต้องการ
     # ==========================================
     async def get_server_status(self) -> bool:
-        """เช็คสถานะ API"""
+        """เช็คสถานะ API (Cache ผลไว้ 2 วินาที กัน Dashboard Poll ถี่เกิน)"""
+        cached_at, cached_value = self._status_cache
+        if cached_value is not None and time.monotonic() - cached_at < 2.0:
+            return cached_value
+
         try:
             res = await self._request("GET", "/api/v3/ping")
-            return res == {}
+            value = res == {}
         except:
-            return False
+            value = False
+        self._status_cache = (time.monotonic(), value)
+        return value
 
-    async def get_candles(self, symbol: str, interval: str = "1h", limit: int = 100) -> List[Dict]:
-        """ดึงกราฟแท่งเทียน"""
+    async def get_candles(self, symbol: str, interval: str = "1h", limit: int = 100) -> Dict[str, np.ndarray]:
+        """ดึงกราฟแท่งเทียน คืนค่าเป็น NumPy Array แยกตามคอลัมน์ (Columnar)"""
         params = {"symbol": symbol, "interval": interval, "limit": limit}
         data = await self._request("GET", "/api/v3/klines", params=params)
-        
-        # จัด Format ให้ตรงกับที่ BotEngine ใช้งาน
-        formatted_candles = []
-        for candle in data:
-            formatted_candles.append({
-                "time": candle[0],
-                "open": float(candle[1]),
-                "high": float(candle[2]),
-                "low": float(candle[3]),
-                "close": float(candle[4]),
-                "volume": float(candle[5])
-            })
-        return formatted_candles
+
+        # แปลงเป็น Array ทีเดียวทั้งก้อน แทนการสร้าง dict + float() ทีละแถว
+        # (BotEngine ส่งต่อให้ Indicator Kernels ได้เลย ไม่ต้องแปลงซ้ำ)
+        arr = np.asarray(data, dtype=object)
+        if arr.size == 0:
+            return {k: np.empty(0, dtype=np.float64) for k in
+                    ("time", "open", "high", "low", "close", "volume")}
+        return {
+            "time": arr[:, 0].astype(np.int64),
+            "open": arr[:, 1].astype(np.float64),
+            "high": arr[:, 2].astype(np.float64),
+            "low": arr[:, 3].astype(np.float64),
+            "close": arr[:, 4].astype(np.float64),
+            "volume": arr[:, 5].astype(np.float64),
+        }
 
     async def get_wallet(self) -> Dict[str, float]:
-        """เช็คยอดเงินที่เหลือ (คืนค่าเฉพาะเหรียญที่มีจำนวนมากกว่า 0)"""
+        """
+        เช็คยอดเงินที่เหลือ (คืนค่าเฉพาะเหรียญที่มีจำนวนมากกว่า 0)
+        Cache ผลไว้ 5 วินาที — /api/v3/account เป็น Signed Request ที่แพง
+        """
+        cached_at, cached_value = self._wallet_cache
+        if cached_value is not None and time.monotonic() - cached_at < 5.0:
+            return cached_value
+
         data = await self._request("GET", "/api/v3/account", signed=True)
         balances = {}
         for b in data['balances']:
             free_amt = float(b['free'])
             if free_amt > 0:
                 balances[b['asset']] = free_amt
+        self._wallet_cache = (time.monotonic(), balances)
         return balances
 
     async def place_order(self, symbol: str, amount: float, rate: float = 0, side: str = "BUY", order_type: str = "MARKET"):
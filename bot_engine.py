@@ -1,9 +1,20 @@
 import asyncio
 import aiosqlite
-import pandas as pd
-import pandas_ta as ta
+import numpy as np
+from collections import defaultdict
 from typing import Callable, Optional
 
+import indicators
+
+# SQL คงที่ระดับโมดูล — ใช้ String Object เดิมซ้ำทุกครั้ง ทำให้ Prepared-statement
+# Cache ของ SQLite Hit โดยไม่ต้อง Parse SQL ใหม่
+_SQL_SELECT_OPEN = "SELECT symbol, price, amount FROM trades WHERE status = 'OPEN'"
+_SQL_INSERT_TRADE = (
+    "INSERT INTO trades (symbol, order_id, side, price, amount, strategy, status) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+_SQL_CLOSE_OPEN = "UPDATE trades SET status = 'CLOSED' WHERE symbol = ? AND status = 'OPEN'"
+
 class BotEngine:
     def __init__(self, client, db_name: str, broadcast_func: Callable):
         self.client = client
@@ -23,6 +34,56 @@ class BotEngine:
         # ตัวแปรสำหรับเก็บสถานะ Trailing Take Profit แบบ In-memory
         self.peak_prices = {} # { "BTCUSDT": 65000.0 }
 
+        # กลยุทธ์ที่ Strategy 4 เลือกใช้ล่าสุดต่อเหรียญ (ให้ /api/status อ่านไปแสดง)
+        self.active_strategies: dict[str, str] = {} # { "BTCUSDT": "strategy_3_macd_cross" }
+
+        # Cache ค่า Indicator ของ Strategy 4 ต่อแท่งเทียน:
+        # { "BTCUSDT": {"ts": เวลาเปิดแท่งล่าสุด, "adx": ..., "ema50": ...} }
+        # แท่ง 15m เปลี่ยนทุก 15 นาที แต่ลูปวิ่งทุก 10 วินาที — ถ้า Timestamp
+        # ไม่เปลี่ยนก็ใช้ค่าเดิมได้เลย ไม่ต้องไล่คำนวณใหม่ทั้ง 100 แท่ง
+        self._indicator_state = {}
+
+        # Connection ถาวรไปยัง SQLite (เปิดครั้งเดียวตอน run แทนการ connect ใหม่
+        # ทุก Query — aiosqlite.connect แต่ละครั้งต้อง Spawn Thread + เปิดไฟล์)
+        self._db: Optional[aiosqlite.Connection] = None
+
+        # Cache ไม้ที่เปิดอยู่แบบ In-memory เก็บเป็น NumPy Array แยกคอลัมน์:
+        # { "BTCUSDT": {"prices": np.ndarray, "amounts": np.ndarray} }
+        # ทุกการเขียนผ่าน execute_trade เท่านั้น State ในหน่วยความจำจึงเป็นตัวจริง
+        # ส่วน SQLite เป็นแค่ Write-through สำหรับเก็บประวัติ/กู้คืนตอนรีสตาร์ท
+        self.open_positions = defaultdict(self._empty_position)
+        self._positions_loaded = False
+
+        # ถือ Reference ของ Write-through Tasks ไว้เอง — Event Loop เก็บแค่
+        # Weak Reference ถ้าไม่ถือไว้ Task อาจโดน GC ก่อนเขียน DB เสร็จ
+        self._pending_writes: set = set()
+
+    @staticmethod
+    def _empty_position():
+        return {"prices": np.empty(0, dtype=np.float64), "amounts": np.empty(0, dtype=np.float64)}
+
+    async def _get_db(self) -> aiosqlite.Connection:
+        """คืน Connection ถาวร (เปิดพร้อมตั้งค่า WAL ในครั้งแรกที่ถูกเรียก)"""
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.db_name)
+            self._db.row_factory = aiosqlite.Row
+            await self._db.execute('PRAGMA journal_mode=WAL;')
+            # synchronous=NORMAL ปลอดภัยเมื่อใช้ WAL และลดค่า fsync ตอน INSERT ลงมาก
+            await self._db.execute('PRAGMA synchronous=NORMAL;')
+            await self._db.execute('PRAGMA temp_store=MEMORY;')
+            await self._db.execute('PRAGMA mmap_size=268435456;')
+        return self._db
+
+    async def close(self):
+        """ปิด Connection ฐานข้อมูล (เรียกตอน Shutdown)"""
+        # รอ Write-through ที่ค้างอยู่ให้เขียนลง DB ครบก่อน ไม่งั้นเทรดหาย
+        # ตอนรีสตาร์ท (_load_open_positions อ่านจาก DB)
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
     async def log(self, message: str, level: str = "info"):
         """ส่ง Log ไปแสดงที่ Dashboard แบบ Real-time"""
         print(f"[{level.upper()}] {message}")
@@ -36,79 +97,105 @@ class BotEngine:
         """Main Loop ของบอท ทำงานวนไปเรื่อยๆ แบบ Async"""
         self.is_running = True
         await self.log("Bot Engine started successfully.")
-        
+
+        # โหลดไม้ที่เปิดอยู่จาก DB เข้าหน่วยความจำครั้งเดียว หลังจากนี้
+        # Hot Path อ่านจาก self.open_positions ล้วนๆ ไม่แตะ SQLite อีก
+        await self._load_open_positions()
+
         while self.is_running:
-            for symbol in self.symbols:
-                try:
-                    # 1. ดึงข้อมูลกราฟและแปลงเป็น DataFrame
-                    candles = await self.client.get_candles(symbol, interval="15m", limit=100)
-                    df = pd.DataFrame(candles)
-                    
-                    # 2. ให้ AI วิเคราะห์สภาวะตลาด (Strategy 4) และเลือกกลยุทธ์
-                    current_price = df['close'].iloc[-1]
-                    regime, active_strategy = await self.strategy_4_auto_ai(df)
-                    
-                    # 3. จัดการออเดอร์ค้าง (DCA & Trailing Take Profit)
-                    await self.manage_open_positions(symbol, current_price)
-                    
-                    # 4. หาจังหวะเข้าซื้อ (ถ้ายังไม่มีไม้ที่เปิดอยู่)
-                    has_open_position = await self.check_open_position(symbol)
-                    if not has_open_position:
-                        signal = active_strategy(df)
-                        if signal == "BUY":
-                            await self.execute_trade(symbol, "BUY", current_price, "Strategy_Auto")
-                            
-                except Exception as e:
-                    await self.log(f"Error processing {symbol}: {str(e)}", "error")
-            
+            # 1. ยิงดึงกราฟทุกเหรียญพร้อมกันเป็น Batch เดียว (Latency ซ้อนทับกันหมด)
+            candle_batches = await asyncio.gather(
+                *(self.client.get_candles(symbol, interval="15m", limit=100)
+                  for symbol in self.symbols),
+                return_exceptions=True
+            )
+
+            # 2. ประมวลผลทุกเหรียญพร้อมกัน (DB + Strategy) ใช้เวลาต่อรอบ
+            #    ~ เหรียญที่ช้าสุด แทนที่จะเป็นผลรวมของทุกเหรียญแบบวนทีละตัว
+            await asyncio.gather(
+                *(self._process_symbol(symbol, candles)
+                  for symbol, candles in zip(self.symbols, candle_batches)),
+                return_exceptions=True
+            )
+
             # หน่วงเวลาเพื่อป้องกัน Rate Limit ของ Binance
             await asyncio.sleep(10)
 
+    async def _process_symbol(self, symbol: str, candles):
+        """ประมวลผล 1 เหรียญ: วิเคราะห์กราฟ -> จัดการออเดอร์ -> หาจังหวะซื้อ"""
+        try:
+            # 1. กราฟถูกดึงมาแล้วเป็น Batch จาก run (NumPy Arrays แบบ Columnar)
+            if isinstance(candles, Exception):
+                raise candles
+            close = candles['close']
+            high = candles['high']
+            low = candles['low']
+
+            # 2. ให้ AI วิเคราะห์สภาวะตลาด (Strategy 4) และเลือกกลยุทธ์
+            current_price = float(close[-1])
+            last_candle_ts = int(candles['time'][-1])
+            regime, active_strategy = await self.strategy_4_auto_ai(symbol, last_candle_ts, high, low, close)
+
+            # 3. จัดการออเดอร์ค้าง (DCA & Trailing Take Profit)
+            #    ได้สถานะไม้ที่เปิดอยู่กลับมาด้วย ไม่ต้อง Query ซ้ำอีกรอบ
+            has_open_position = await self.manage_open_positions(symbol, current_price)
+
+            # 4. หาจังหวะเข้าซื้อ (ถ้ายังไม่มีไม้ที่เปิดอยู่)
+            if not has_open_position:
+                signal = active_strategy(close)
+                if signal == "BUY":
+                    await self.execute_trade(symbol, "BUY", current_price, "Strategy_Auto")
+
+        except Exception as e:
+            await self.log(f"Error processing {symbol}: {str(e)}", "error")
+
     # ==========================================
     # ส่วนที่ 1: กลยุทธ์การเทรด (Multi-Strategy)
     # ==========================================
-    def strategy_1_trend_reversal(self, df: pd.DataFrame) -> str:
+    def strategy_1_trend_reversal(self, close: np.ndarray) -> str:
         """Strategy 1: ปลอดภัย ซื้อเมื่อ Oversold + ขาลง"""
-        df.ta.rsi(length=14, append=True)
-        rsi = df['RSI_14'].iloc[-1]
+        rsi = indicators.rsi_last(close, 14)
         if rsi < 30: return "BUY"
         if rsi > 70: return "SELL"
         return "HOLD"
 
-    def strategy_2_rsi_scalping(self, df: pd.DataFrame) -> str:
+    def strategy_2_rsi_scalping(self, close: np.ndarray) -> str:
         """Strategy 2: เล่นรอบสั้น"""
-        df.ta.rsi(length=7, append=True) # ใช้ RSI สั้นลง
-        rsi = df['RSI_7'].iloc[-1]
+        rsi = indicators.rsi_last(close, 7) # ใช้ RSI สั้นลง
         if rsi < 25: return "BUY"
         if rsi > 75: return "SELL"
         return "HOLD"
 
-    def strategy_3_macd_cross(self, df: pd.DataFrame) -> str:
+    def strategy_3_macd_cross(self, close: np.ndarray) -> str:
         """Strategy 3: ถือรันเทรนด์"""
-        macd = df.ta.macd(fast=12, slow=26, signal=9)
-        macd_line = macd['MACD_12_26_9'].iloc[-1]
-        signal_line = macd['MACDs_12_26_9'].iloc[-1]
-        
+        macd_prev, macd_line, signal_prev, signal_line = indicators.macd_last_two(close, 12, 26, 9)
+
         # ตัดขึ้นซื้อ ตัดลงขาย
-        if macd_line > signal_line and macd['MACD_12_26_9'].iloc[-2] <= macd['MACDs_12_26_9'].iloc[-2]:
+        if macd_line > signal_line and macd_prev <= signal_prev:
             return "BUY"
         return "HOLD"
 
-    async def strategy_4_auto_ai(self, df: pd.DataFrame):
+    async def strategy_4_auto_ai(self, symbol: str, last_candle_ts: int,
+                                 high: np.ndarray, low: np.ndarray, close: np.ndarray):
         """
         Strategy 4 (Market Regime Detection)
         วิเคราะห์ ADX และ EMA เพื่อหาสภาวะตลาดและเลือกกลยุทธ์ 1-3
+        (คำนวณใหม่เฉพาะตอนมีแท่งเทียนใหม่เท่านั้น ระหว่างแท่งใช้ค่าจาก Cache)
         """
-        df.ta.adx(length=14, append=True)
-        df.ta.ema(length=50, append=True)
-        
-        adx = df['ADX_14'].iloc[-1]
-        close = df['close'].iloc[-1]
-        ema50 = df['EMA_50'].iloc[-1]
-        
+        state = self._indicator_state.get(symbol)
+        if state is not None and state["ts"] == last_candle_ts:
+            adx = state["adx"]
+            ema50 = state["ema50"]
+            new_candle = False
+        else:
+            adx = indicators.adx_last(high, low, close, 14)
+            ema50 = indicators.ema_last(close, 50)
+            self._indicator_state[symbol] = {"ts": last_candle_ts, "adx": adx, "ema50": ema50}
+            new_candle = True
+
         # เช็คความแรงของเทรนด์
         if adx > 25:
-            if close > ema50:
+            if close[-1] > ema50:
                 regime = "BULLISH"
                 strategy = self.strategy_3_macd_cross # เทรนด์ขาขึ้นชัดเจน ใช้ MACD รันเทรนด์
             else:
@@ -117,60 +204,100 @@ class BotEngine:
         else:
             regime = "SIDEWAYS"
             strategy = self.strategy_2_rsi_scalping # ไม่มีเทรนด์ เล่นสั้น Scalping
-            
-        await self.log(f"Market Regime: {regime} | Selected Strategy: {strategy.__name__}")
+
+        # อัปเดตกลยุทธ์ที่เลือกให้ Dashboard เห็นผ่าน /api/status
+        self.active_strategies[symbol] = strategy.__name__
+
+        # Log เฉพาะตอนแท่งใหม่ จะได้ไม่สแปม Dashboard ทุก 10 วินาที
+        if new_candle:
+            await self.log(f"Market Regime: {regime} | Selected Strategy: {strategy.__name__}")
         return regime, strategy
 
     # ==========================================
     # ส่วนที่ 2: Money Management (DCA & TTP)
     # ==========================================
     async def manage_open_positions(self, symbol: str, current_price: float):
-        """ตรวจสอบและจัดการ Smart DCA และ Trailing Take Profit"""
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM trades WHERE symbol = ? AND status = 'OPEN'", (symbol,))
-            trades = await cursor.fetchall()
-            
-            if not trades:
-                self.peak_prices.pop(symbol, None) # เคลียร์ค่า Peak ถ้าไม่มีออเดอร์
-                return
-                
-            # คำนวณต้นทุนเฉลี่ย
-            total_amount = sum(t['amount'] for t in trades)
-            total_cost = sum(t['price'] * t['amount'] for t in trades)
-            avg_price = total_cost / total_amount if total_amount > 0 else 0
-            
-            profit_pct = (current_price - avg_price) / avg_price
-
-            # 1. เช็ค Smart DCA (ถ้าราคาตกเกินกำหนด)
-            if profit_pct <= -self.dca_drop_pct:
-                await self.log(f"[{symbol}] ราคาตก {profit_pct*100:.2f}% ทำการ Smart DCA!")
-                await self.execute_trade(symbol, "BUY", current_price, "DCA")
-                return # ออกจากฟังก์ชัน รอให้ลูปรอบหน้ามาจัดการต่อ
-
-            # 2. เช็ค Trailing Take Profit (TTP)
-            if profit_pct >= self.ttp_activation_pct:
-                # อัปเดตจุดสูงสุด
-                current_peak = self.peak_prices.get(symbol, avg_price)
-                if current_price > current_peak:
-                    self.peak_prices[symbol] = current_price
-                    await self.log(f"[{symbol}] อัปเดตจุด Trailing Peak ใหม่: {current_price}")
-                
-                # เช็คว่าราคาตกลงมาจากจุดสูงสุดเกินระยะ Trailing หรือยัง
-                drawdown_from_peak = (self.peak_prices[symbol] - current_price) / self.peak_prices[symbol]
-                if drawdown_from_peak >= self.ttp_trail_pct:
-                    await self.log(f"[{symbol}] ราคาตกลงจากจุดสูงสุด ทริกเกอร์ Trailing Take Profit! รวบยอดขายทั้งหมด")
-                    await self.execute_trade(symbol, "SELL", current_price, "TTP", close_all_amount=total_amount)
+        """
+        ตรวจสอบและจัดการ Smart DCA และ Trailing Take Profit
+        คืนค่า True ถ้ามีไม้เปิดอยู่ (ผู้เรียกไม่ต้อง Query ซ้ำ)
+        """
+        # อ่านจาก Cache ในหน่วยความจำ ไม่มี SQLite บน Hot Path
+        position = self.open_positions[symbol]
+        prices = position["prices"]
+        amounts = position["amounts"]
+
+        if amounts.size == 0:
+            self.peak_prices.pop(symbol, None) # เคลียร์ค่า Peak ถ้าไม่มีออเดอร์
+            return False
+
+        # คำนวณต้นทุนเฉลี่ยด้วย Vectorized dot product (ผ่านข้อมูลรอบเดียว)
+        total_amount = float(amounts.sum())
+        avg_price = float(np.dot(prices, amounts)) / total_amount if total_amount > 0 else 0
+
+        profit_pct = (current_price - avg_price) / avg_price
+
+        # 1. เช็ค Smart DCA (ถ้าราคาตกเกินกำหนด)
+        if profit_pct <= -self.dca_drop_pct:
+            await self.log(f"[{symbol}] ราคาตก {profit_pct*100:.2f}% ทำการ Smart DCA!")
+            await self.execute_trade(symbol, "BUY", current_price, "DCA")
+            return True # ออกจากฟังก์ชัน รอให้ลูปรอบหน้ามาจัดการต่อ
+
+        # 2. เช็ค Trailing Take Profit (TTP)
+        if profit_pct >= self.ttp_activation_pct:
+            # อัปเดตจุดสูงสุด
+            current_peak = self.peak_prices.get(symbol, avg_price)
+            if current_price > current_peak:
+                self.peak_prices[symbol] = current_price
+                await self.log(f"[{symbol}] อัปเดตจุด Trailing Peak ใหม่: {current_price}")
+
+            # เช็คว่าราคาตกลงมาจากจุดสูงสุดเกินระยะ Trailing หรือยัง
+            drawdown_from_peak = (self.peak_prices[symbol] - current_price) / self.peak_prices[symbol]
+            if drawdown_from_peak >= self.ttp_trail_pct:
+                await self.log(f"[{symbol}] ราคาตกลงจากจุดสูงสุด ทริกเกอร์ Trailing Take Profit! รวบยอดขายทั้งหมด")
+                await self.execute_trade(symbol, "SELL", current_price, "TTP", close_all_amount=total_amount)
+
+        return True
 
     # ==========================================
     # ส่วนที่ 3: Execution & Database
     # ==========================================
-    async def check_open_position(self, symbol: str) -> bool:
-        """เช็คว่ามีไม้ค้างอยู่หรือไม่ (เพื่อป้องกันการซื้อซ้ำซ้อนถ้าไม่ได้เข้าเงื่อนไข DCA)"""
-        async with aiosqlite.connect(self.db_name) as db:
-            cursor = await db.execute("SELECT COUNT(*) FROM trades WHERE symbol = ? AND status = 'OPEN'", (symbol,))
-            result = await cursor.fetchone()
-            return result[0] > 0
+    async def _load_open_positions(self):
+        """โหลดไม้ที่ยังเปิดอยู่จาก DB เข้า Cache (เรียกครั้งเดียวตอนบอทเริ่มทำงาน)"""
+        if self._positions_loaded:
+            return
+        db = await self._get_db()
+        cursor = await db.execute(_SQL_SELECT_OPEN)
+        rows = await cursor.fetchall()
+        grouped = defaultdict(lambda: ([], []))
+        for row in rows:
+            prices, amounts = grouped[row['symbol']]
+            prices.append(row['price'])
+            amounts.append(row['amount'])
+        self.open_positions.clear()
+        for symbol, (prices, amounts) in grouped.items():
+            self.open_positions[symbol] = {
+                "prices": np.asarray(prices, dtype=np.float64),
+                "amounts": np.asarray(amounts, dtype=np.float64),
+            }
+        self._positions_loaded = True
+
+    async def _persist_trade(self, symbol: str, side: str, order_id: str, price: float,
+                             amount: float, strategy_name: str):
+        """Write-through ลง SQLite (รันเป็น Background Task ไม่บล็อกลูปเทรด)"""
+        try:
+            db = await self._get_db()
+            if side == "BUY":
+                # บันทึกไม้ซื้อใหม่
+                await db.execute(
+                    _SQL_INSERT_TRADE,
+                    (symbol, order_id, side, price, amount, strategy_name, 'OPEN')
+                )
+            elif side == "SELL":
+                # ปิดไม้ซื้อทั้งหมดที่เป็น OPEN อยู่
+                await db.execute(_SQL_CLOSE_OPEN, (symbol,))
+            await db.commit()
+        except Exception as e:
+            await self.log(f"บันทึกเทรด {symbol} ลงฐานข้อมูลไม่สำเร็จ: {str(e)}", "error")
 
     async def execute_trade(self, symbol: str, side: str, price: float, strategy_name: str, close_all_amount: float = None):
         """ส่งคำสั่งซื้อขายไปที่ Binance และบันทึกลงฐานข้อมูล"""
@@ -181,10 +308,14 @@ class BotEngine:
         else:
             qty = self.trade_amount_usdt / price
         
-        # ⚠️ กฎ Binance: มูลค่าต้องเกิน Min Notional (เช่น 10 USDT)
-        notional_value = qty * price
-        if notional_value < 10.0:
-            await self.log(f"ปฏิเสธคำสั่ง {side} {symbol}: มูลค่า ({notional_value:.2f} USDT) ต่ำกว่าขั้นต่ำของ Binance (10 USDT)", "warning")
+        # ⚠️ กฎ Binance: มูลค่าต้องเกิน Min Notional
+        # เช็คด้วยจำนวนจริงหลังปัดลงตาม LOT_SIZE (การปัดอาจทำให้มูลค่าหลุดขั้นต่ำ)
+        # และใช้ค่า minNotional จริงของเหรียญ จะได้ไม่เสียเที่ยวยิง API แล้วโดนปฏิเสธ
+        effective_qty = float(self.client.calc_effective_qty(symbol, qty))
+        min_notional = max(10.0, self.client.get_min_notional(symbol))
+        notional_value = effective_qty * price
+        if notional_value < min_notional:
+            await self.log(f"ปฏิเสธคำสั่ง {side} {symbol}: มูลค่า ({notional_value:.2f} USDT) ต่ำกว่าขั้นต่ำของ Binance ({min_notional:g} USDT)", "warning")
             return
 
         try:
@@ -195,20 +326,19 @@ class BotEngine:
             order_id = str(order_res.get('orderId', 'TEST_ORDER_ID'))
             executed_qty = float(order_res.get('executedQty', qty))
             
-            async with aiosqlite.connect(self.db_name) as db:
-                if side == "BUY":
-                    # บันทึกไม้ซื้อใหม่
-                    await db.execute(
-                        "INSERT INTO trades (symbol, order_id, side, price, amount, strategy, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (symbol, order_id, side, price, executed_qty, strategy_name, 'OPEN')
-                    )
-                elif side == "SELL":
-                    # ปิดไม้ซื้อทั้งหมดที่เป็น OPEN อยู่
-                    await db.execute(
-                        "UPDATE trades SET status = 'CLOSED' WHERE symbol = ? AND status = 'OPEN'", 
-                        (symbol,)
-                    )
-                await db.commit()
+            # อัปเดต Cache ในหน่วยความจำทันที (ตัวจริง) แล้วค่อย Write-through
+            # ลง DB เป็น Background Task โดยไม่รอ fsync บน Hot Path
+            if side == "BUY":
+                position = self.open_positions[symbol]
+                position["prices"] = np.append(position["prices"], price)
+                position["amounts"] = np.append(position["amounts"], executed_qty)
+            elif side == "SELL":
+                self.open_positions.pop(symbol, None)
+            task = asyncio.create_task(
+                self._persist_trade(symbol, side, order_id, price, executed_qty, strategy_name)
+            )
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
                 
             await self.log(f"ดำเนินการ {side} {symbol} สำเร็จ! [Strategy: {strategy_name}, Price: {price}, Qty: {executed_qty}]", "success")
             
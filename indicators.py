@@ -0,0 +1,154 @@
+import numpy as np
+from numba import njit
+
+# ==========================================
+# Indicator Kernels (NumPy + Numba)
+# ==========================================
+# แทนที่ pandas_ta ใน Hot Path ของบอท: pandas_ta สร้าง Series/คอลัมน์ใหม่
+# ทั้งที่เราใช้แค่ค่าแท่งสุดท้าย การคำนวณบน np.ndarray ตรงๆ ด้วย @njit
+# เร็วกว่าหลายเท่าสำหรับข้อมูลแค่ 100 แท่ง (Overhead ของ pandas แพงกว่าคณิตศาสตร์จริง)
+# ทุกฟังก์ชันใช้ Wilder/EMA Smoothing แบบเดียวกับ pandas_ta เพื่อให้สัญญาณตรงกันเดิม
+
+
+def warmup():
+    """
+    Trigger การ JIT Compile ทุก Kernel ล่วงหน้า (ครั้งแรกกินเวลา ~1-2 วินาที
+    ถ้าไม่มี Disk Cache) ควรเรียกผ่าน asyncio.to_thread ตอน Startup
+    จะได้ไม่ไปบล็อก Event Loop ในรอบเทรดแรก
+    """
+    dummy = np.zeros(100, dtype=np.float64)
+    ema_last(dummy, 50)
+    rsi_last(dummy, 14)
+    macd_last_two(dummy, 12, 26, 9)
+    adx_last(dummy, dummy, dummy, 14)
+
+
+@njit(cache=True)
+def ema_last(close: np.ndarray, length: int) -> float:
+    """คืนค่า EMA แท่งสุดท้าย (Seed ด้วย SMA ของ length แท่งแรก)"""
+    n = close.shape[0]
+    if n < length:
+        return np.nan
+
+    ema = 0.0
+    for i in range(length):
+        ema += close[i]
+    ema /= length
+
+    alpha = 2.0 / (length + 1.0)
+    for i in range(length, n):
+        ema = alpha * close[i] + (1.0 - alpha) * ema
+    return ema
+
+
+@njit(cache=True)
+def rsi_last(close: np.ndarray, length: int) -> float:
+    """คืนค่า RSI แท่งสุดท้าย (Wilder Smoothing)"""
+    n = close.shape[0]
+    if n <= length:
+        return np.nan
+
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, length + 1):
+        diff = close[i] - close[i - 1]
+        if diff > 0.0:
+            avg_gain += diff
+        else:
+            avg_loss -= diff
+    avg_gain /= length
+    avg_loss /= length
+
+    for i in range(length + 1, n):
+        diff = close[i] - close[i - 1]
+        gain = diff if diff > 0.0 else 0.0
+        loss = -diff if diff < 0.0 else 0.0
+        avg_gain = (avg_gain * (length - 1) + gain) / length
+        avg_loss = (avg_loss * (length - 1) + loss) / length
+
+    if avg_loss == 0.0:
+        return 100.0
+    rs = avg_gain / avg_loss
+    return 100.0 - 100.0 / (1.0 + rs)
+
+
+@njit(cache=True)
+def macd_last_two(close: np.ndarray, fast: int, slow: int, signal: int):
+    """
+    คืนค่า MACD สองแท่งสุดท้ายสำหรับเช็คการตัดกัน (Cross)
+    -> (macd_prev, macd_last, signal_prev, signal_last)
+    """
+    n = close.shape[0]
+    alpha_fast = 2.0 / (fast + 1.0)
+    alpha_slow = 2.0 / (slow + 1.0)
+    alpha_sig = 2.0 / (signal + 1.0)
+
+    ema_fast = close[0]
+    ema_slow = close[0]
+    macd = 0.0
+    macd_prev = 0.0
+    sig = 0.0
+    sig_prev = 0.0
+    for i in range(1, n):
+        ema_fast = alpha_fast * close[i] + (1.0 - alpha_fast) * ema_fast
+        ema_slow = alpha_slow * close[i] + (1.0 - alpha_slow) * ema_slow
+        macd_prev = macd
+        macd = ema_fast - ema_slow
+        sig_prev = sig
+        sig = alpha_sig * macd + (1.0 - alpha_sig) * sig
+
+    return macd_prev, macd, sig_prev, sig
+
+
+@njit(cache=True)
+def adx_last(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int) -> float:
+    """คืนค่า ADX แท่งสุดท้าย (Wilder Smoothing ทั้ง DM/TR และตัว DX)"""
+    n = high.shape[0]
+    if n <= 2 * length:
+        return np.nan
+
+    # Smoothed ค่าเริ่มต้น = ผลรวมของ length แท่งแรก
+    tr_s = 0.0
+    plus_s = 0.0
+    minus_s = 0.0
+    for i in range(1, length + 1):
+        tr = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        up = high[i] - high[i - 1]
+        dn = low[i - 1] - low[i]
+        plus_dm = up if (up > dn and up > 0.0) else 0.0
+        minus_dm = dn if (dn > up and dn > 0.0) else 0.0
+        tr_s += tr
+        plus_s += plus_dm
+        minus_s += minus_dm
+
+    adx = 0.0
+    dx_count = 0
+    for i in range(length + 1, n):
+        tr = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        up = high[i] - high[i - 1]
+        dn = low[i - 1] - low[i]
+        plus_dm = up if (up > dn and up > 0.0) else 0.0
+        minus_dm = dn if (dn > up and dn > 0.0) else 0.0
+
+        # Wilder Smoothing: ค่าใหม่ = ค่าเดิม - ค่าเดิม/length + ค่าปัจจุบัน
+        tr_s = tr_s - tr_s / length + tr
+        plus_s = plus_s - plus_s / length + plus_dm
+        minus_s = minus_s - minus_s / length + minus_dm
+
+        if tr_s == 0.0:
+            continue
+        plus_di = 100.0 * plus_s / tr_s
+        minus_di = 100.0 * minus_s / tr_s
+        di_sum = plus_di + minus_di
+        dx = 100.0 * abs(plus_di - minus_di) / di_sum if di_sum > 0.0 else 0.0
+
+        # ADX = Wilder Average ของ DX (เริ่มจากค่าเฉลี่ยธรรมดา length ตัวแรก)
+        dx_count += 1
+        if dx_count <= length:
+            adx += dx
+            if dx_count == length:
+                adx /= length
+        else:
+            adx = (adx * (length - 1) + dx) / length
+
+    return adx
@@ -8,7 +8,8 @@ from dotenv import load_dotenv # เพิ่ม import โหลด .env
 
 # นำเข้าคลาสที่เราสร้างไว้
 from binance_api import BinanceAsyncClient
-from bot_engine import BotEngine 
+from bot_engine import BotEngine
+import indicators
 
 # ==========================================
 # 1. โหลด Environment Variables
@@ -79,11 +80,22 @@ async def init_db():
 # ==========================================
 async def broadcast_log(log_data: dict):
     """ส่งข้อความไปยังทุก WebSocket ที่เชื่อมต่ออยู่ (Dashboard)"""
-    for connection in active_websockets:
-        try:
-            await connection.send_json(log_data)
-        except Exception as e:
-            print(f"WebSocket send error: {e}")
+    if not active_websockets:
+        return
+    # ส่งพร้อมกันทุก Connection จะได้ไม่ติดรอ Client ที่ช้าทีละตัว
+    # และถอดเฉพาะ Socket ที่ส่งไม่สำเร็จออกจากลิสต์ ไม่ให้ Error ซ้ำทุกรอบ
+    # (ห้าม Rebuild ทั้งลิสต์ — broadcast_log หลายตัววิ่งซ้อนกันได้ และ Client
+    # ที่เพิ่งเชื่อมต่อระหว่าง gather จะโดนลบทิ้งทั้งที่ยังไม่ตาย)
+    connections = list(active_websockets)
+    results = await asyncio.gather(
+        *(connection.send_json(log_data) for connection in connections),
+        return_exceptions=True
+    )
+    for connection, result in zip(connections, results):
+        if isinstance(result, Exception):
+            print(f"WebSocket send error: {result}")
+            if connection in active_websockets:
+                active_websockets.remove(connection)
 
 # ==========================================
 # 4. FastAPI Events (Startup & Shutdown)
@@ -95,18 +107,23 @@ async def startup_event():
     # 1. เตรียม Database
     await init_db()
     
-    # 2. โหลดกฎของกระดานเทรด (สำคัญมากสำหรับจัดการทศนิยม Binance)
+    # 2. Warm up Numba Kernels ใน Thread แยก (JIT Compile ครั้งแรก ~1-2 วินาที
+    #    ทำตอนนี้เลย จะได้ไม่ไปบล็อกลูปเทรดรอบแรก)
+    print("Warming up indicator kernels...")
+    await asyncio.to_thread(indicators.warmup)
+
+    # 3. โหลดกฎของกระดานเทรด (สำคัญมากสำหรับจัดการทศนิยม Binance)
     print("Loading exchange info from Binance...")
     await binance_client.load_exchange_info()
     
-    # 3. เริ่มต้น BotEngine และส่ง Client, DB, และฟังก์ชัน Broadcast เข้าไป
+    # 4. เริ่มต้น BotEngine และส่ง Client, DB, และฟังก์ชัน Broadcast เข้าไป
     bot_engine = BotEngine(
         client=binance_client, 
         db_name=DB_NAME, 
         broadcast_func=broadcast_log
     )
     
-    # 4. รันระบบเทรดเป็น Background Task (เพื่อไม่ให้บล็อก API)
+    # 5. รันระบบเทรดเป็น Background Task (เพื่อไม่ให้บล็อก API)
     asyncio.create_task(bot_engine.run())
     print("Bot Engine is running in the background!")
 
@@ -114,6 +131,10 @@ async def startup_event():
 async def shutdown_event():
     if bot_engine:
         bot_engine.stop()
+        # ปิด Connection ฐานข้อมูลถาวรของ BotEngine
+        await bot_engine.close()
+    # ปิด Connection Pool ของ httpx คืน Socket ให้ระบบ
+    await binance_client.close()
     print("Bot gracefully shut down.")
 
 # ==========================================
@@ -180,4 +201,6 @@ async def websocket_endpoint(websocket: WebSocket):
                     await broadcast_log({"type": "error", "msg": "รูปแบบตัวเลขไม่ถูกต้อง"})
                 
     except WebSocketDisconnect:
-        active_websockets.remove(websocket)
\ No newline at end of file
+        # อาจถูก broadcast_log ถอดออกไปก่อนแล้ว ถ้า Socket ตายกลางทาง
+        if websocket in active_websockets:
+            active_websockets.remove(websocket)
\ No newline at end of file